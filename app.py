@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from PIL import Image
-import tempfile
+import numpy as np
+import cv2
 import os
 import sys
 
@@ -32,9 +32,19 @@ st.markdown("---")
 # Initialize components
 @st.cache_resource
 def init_components():
+    ocr = OCREngine(use_easyocr=True)
+    # Warm up the OCR models once per server process so the first
+    # uploaded receipt doesn't pay the cold-start cost. The image needs
+    # text on it so the detector finds boxes and the recognizer runs too.
+    warmup_img = np.full((600, 800, 3), 255, dtype=np.uint8)
+    for i, line in enumerate(["GROCERY MART", "MILK 2x $3.99", "TOTAL $3.99"]):
+        cv2.putText(warmup_img, line, (40, 120 + i * 140),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    ocr.extract_text(warmup_img)
+    
     return {
         'image_processor': ImageProcessor(),
-        'ocr': OCREngine(use_easyocr=True),
+        'ocr': ocr,
         'parser': DataParser(),
         'categorizer': ExpenseCategorizer(),
         'analyzer': SpendingAnalyzer(),
@@ -43,6 +53,64 @@ def init_components():
 
 components = init_components()
 
+# Run the receipt pipeline, cached on the uploaded bytes so widget
+# interactions don't re-run OCR on the same receipt
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def run_pipeline(image_bytes: bytes) -> dict:
+    # Decode in memory instead of round-tripping through a temp file
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode uploaded image")
+    
+    # Step 1: Image preprocessing
+    processed_img = components['image_processor'].preprocess(img)
+    
+    # Step 2: OCR extraction
+    extracted_text = components['ocr'].extract_text(processed_img)
+    
+    # Step 3: Parse data
+    items = components['parser'].parse(extracted_text)
+    results = {'extracted_text': extracted_text, 'items': items}
+    if not items:
+        return results
+    
+    # Step 4: Categorize expenses
+    categorized = components['categorizer'].categorize(items)
+    
+    # Build the items table once; display, CSV and totals all derive from it
+    items_df = pd.DataFrame(
+        [(category, item.name, item.quantity, item.price)
+         for category, cat_items in categorized.items() for item in cat_items],
+        columns=['Category', 'Item', 'Quantity', 'Price']
+    )
+    
+    # Calculate totals
+    category_totals = items_df.groupby('Category', sort=False)['Price'].sum().to_dict()
+    total = float(items_df['Price'].sum())
+    
+    # Step 5: Analyze spending
+    results.update({
+        'items_df': items_df,
+        'category_totals': category_totals,
+        'percentages': components['analyzer'].calculate_percentages(category_totals, total),
+        'anomalies': components['analyzer'].identify_anomalies(category_totals),
+        'summary_stats': components['analyzer'].generate_summary_stats(
+            items, categorized, category_totals=category_totals, total=total
+        )
+    })
+    return results
+
+# Cache the pie chart so reruns don't rebuild and reserialize the figure
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_pie(category_totals: dict) -> go.Figure:
+    fig = px.pie(
+        values=list(category_totals.values()),
+        names=list(category_totals.keys()),
+        title="Expense Distribution"
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
 # Sidebar for API key input
 with st.sidebar:
     st.header("⚙️ Configuration")
@@ -74,55 +142,34 @@ with col1:
     )
     
     if uploaded_file:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-        
         # Display original image
         st.subheader("Original Receipt")
-        image = Image.open(uploaded_file)
-        st.image(image, width='stretch')
+        st.image(uploaded_file.getvalue(), width='stretch')
 
 with col2:
     if uploaded_file:
         st.header("🔄 Processing")
         
         with st.spinner("Processing receipt..."):
-            # Step 1: Image preprocessing
-            st.info("1. Preprocessing image...")
-            processed_img = components['image_processor'].preprocess(tmp_path)
-            
-            # Step 2: OCR extraction
-            st.info("2. Extracting text with OCR...")
-            extracted_text = components['ocr'].extract_text(processed_img)
-            
-            # Show extracted text in expander
-            with st.expander("View extracted text"):
-                st.text(extracted_text)
-            
-            # Step 3: Parse data
-            st.info("3. Parsing items and prices...")
-            items = components['parser'].parse(extracted_text)
+            results = run_pipeline(uploaded_file.getvalue())
+        
+        extracted_text = results['extracted_text']
+        items = results['items']
+        
+        # Show extracted text in expander
+        with st.expander("View extracted text"):
+            st.text(extracted_text)
+        
+        if items:
+            df = results['items_df']
+            category_totals = results['category_totals']
+            percentages = results['percentages']
+            anomalies = results['anomalies']
+            summary_stats = results['summary_stats']
             
-            if items:
-                # Step 4: Categorize expenses
-                st.info("4. Categorizing expenses...")
-                categorized = components['categorizer'].categorize(items)
-                
-                # Calculate totals
-                category_totals = components['categorizer'].calculate_category_totals(categorized)
-                total = components['parser'].calculate_total(items)
-                
-                # Step 5: Analyze spending
-                st.info("5. Analyzing spending patterns...")
-                percentages = components['analyzer'].calculate_percentages(category_totals, total)
-                anomalies = components['analyzer'].identify_anomalies(category_totals)
-                summary_stats = components['analyzer'].generate_summary_stats(items, categorized)
-                
-                st.success("✅ Processing complete!")
-            else:
-                st.error("No items could be extracted. Please try a clearer image.")
+            st.success("✅ Processing complete!")
+        else:
+            st.error("No items could be extracted. Please try a clearer image.")
 
 # Results section
 if uploaded_file and items:
@@ -146,31 +193,14 @@ if uploaded_file and items:
     with col_left:
         st.subheader("📋 Items by Category")
         
-        # Create DataFrame for display
-        items_data = []
-        for category, cat_items in categorized.items():
-            for item in cat_items:
-                items_data.append({
-                    'Category': category,
-                    'Item': item.name,
-                    'Quantity': item.quantity,
-                    'Price': f"${item.price:.2f}"
-                })
-        
-        df = pd.DataFrame(items_data)
-        st.dataframe(df, width='stretch', hide_index=True)
+        # Prices are formatted for display only; df keeps the raw numbers
+        st.dataframe(df.style.format({'Price': '${:.2f}'}), width='stretch', hide_index=True)
     
     with col_right:
         st.subheader("💰 Spending by Category")
         
         # Create pie chart
-        fig = px.pie(
-            values=list(category_totals.values()),
-            names=list(category_totals.keys()),
-            title="Expense Distribution"
-        )
-        fig.update_traces(textposition='inside', textinfo='percent+label')
-        st.plotly_chart(fig, width='stretch')
+        st.plotly_chart(build_pie(category_totals), width='stretch')
         
         # Category totals table
         totals_data = []
@@ -199,7 +229,18 @@ if uploaded_file and items:
     st.markdown("---")
     st.header("🤖 AI-Powered Financial Advice")
     
-    with st.spinner("Generating personalized advice..."):
+    if components['advisor'].use_llm and not components['advisor'].is_trivial_summary(
+        summary_stats, anomalies, percentages
+    ):
+        # Stream the LLM response so text appears as soon as it's generated
+        advice_stream = components['advisor'].generate_advice_stream(
+            summary_stats, anomalies, percentages
+        )
+        st.write_stream(advice_stream)
+        if not advice_stream.complete:
+            st.warning("⚠️ The AI response was interrupted, so this advice may be incomplete.")
+        st.caption(f"Source: {advice_stream.source}")
+    else:
         advice = components['advisor'].generate_advice(
             summary_stats, anomalies, percentages
         )
@@ -230,9 +271,6 @@ if uploaded_file and items:
         file_name="receipt_analysis.csv",
         mime="text/csv"
     )
-    
-    # Cleanup
-    os.unlink(tmp_path)
 
 # Footer
 st.markdown("---")
@@ -1,5 +1,6 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from modules.data_parser import ReceiptItem
+from modules.categorizer import ExpenseCategorizer
 import numpy as np
 import logging
 
@@ -24,9 +25,9 @@ class SpendingAnalyzer:
         if total == 0:
             return {}
         
-        percentages = {}
-        for category, amount in category_totals.items():
-            percentages[category] = (amount / total) * 100
+        amounts = np.fromiter(category_totals.values(), dtype=np.float64,
+                              count=len(category_totals))
+        percentages = dict(zip(category_totals, (amounts / total * 100).tolist()))
         
         logger.info("Calculated spending percentages")
         return percentages
@@ -38,43 +39,58 @@ class SpendingAnalyzer:
         Returns:
             List of anomalies with category, amount, threshold, and severity
         """
-        anomalies = []
+        categories = list(category_totals)
+        amounts = np.fromiter(category_totals.values(), dtype=np.float64,
+                              count=len(categories))
+        
+        # Threshold of the main category (e.g., "Groceries > Dairy" -> "Groceries")
+        thresholds = [self.category_thresholds.get(category.split(' > ', 1)[0], 50)
+                      for category in categories]
+        threshold_arr = np.array(thresholds, dtype=np.float64)
+        
+        # Check which categories exceed their threshold
+        exceeded = amounts > threshold_arr
+        high = amounts > threshold_arr * 1.5
         
-        for category, amount in category_totals.items():
-            # Extract main category from full path (e.g., "Groceries > Dairy" -> "Groceries")
-            main_category = category.split(' > ')[0]
-            
-            # Check if category exceeds threshold
-            threshold = self.category_thresholds.get(main_category, 50)
-            
-            if amount > threshold:
-                anomalies.append({
-                    'category': category,
-                    'amount': amount,
-                    'threshold': threshold,
-                    'excess': amount - threshold,
-                    'severity': 'High' if amount > threshold * 1.5 else 'Medium'
-                })
+        anomalies = []
+        for i in np.flatnonzero(exceeded):
+            amount = float(amounts[i])
+            anomalies.append({
+                'category': categories[i],
+                'amount': amount,
+                'threshold': thresholds[i],
+                'excess': amount - thresholds[i],
+                'severity': 'High' if high[i] else 'Medium'
+            })
         
         logger.info(f"Identified {len(anomalies)} anomalies")
         return anomalies
     
-    def generate_summary_stats(self, items: List[ReceiptItem], categorized: Dict) -> Dict:
-        """Generate comprehensive spending statistics"""
+    def generate_summary_stats(self, items: List[ReceiptItem], categorized: Dict,
+                               category_totals: Optional[Dict[str, float]] = None,
+                               total: Optional[float] = None) -> Dict:
+        """
+        Generate comprehensive spending statistics
+        
+        category_totals and total may be passed in when the caller has
+        already computed them, to avoid another pass over the items.
+        """
         
-        # Basic stats
+        # Basic stats and most expensive item in a single pass
         total_items = len(items)
-        total_spent = sum(item.price for item in items)
-        avg_item_price = total_spent / total_items if total_items > 0 else 0
+        running_total = 0.0
+        most_expensive = None
+        for item in items:
+            running_total += item.price
+            if most_expensive is None or item.price > most_expensive.price:
+                most_expensive = item
         
-        # Find most expensive item
-        if items:
-            most_expensive = max(items, key=lambda x: x.price)
-        else:
-            most_expensive = None
+        total_spent = running_total if total is None else total
+        avg_item_price = total_spent / total_items if total_items > 0 else 0
         
         # Category with highest spending
-        category_totals = self.calculate_category_totals(categorized)
+        if category_totals is None:
+            category_totals = ExpenseCategorizer.calculate_category_totals(categorized)
         if category_totals:
             top_category = max(category_totals, key=category_totals.get)
             top_category_amount = category_totals[top_category]
@@ -96,11 +112,3 @@ class SpendingAnalyzer:
             },
             'category_count': len(category_totals)
         }
-    
-    def calculate_category_totals(self, categorized: Dict) -> Dict[str, float]:
-        """Helper to calculate totals per category"""
-        totals = {}
-        for category, items in categorized.items():
-            totals[category] = sum(item.price for item in items)
-
-        return totals
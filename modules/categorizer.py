@@ -1,3 +1,4 @@
+from operator import attrgetter
 from typing import Dict, List
 from modules.data_parser import ReceiptItem
 import logging
@@ -55,6 +56,18 @@ class ExpenseCategorizer:
                 }
             }
         }
+        
+        # Flattened (keyword, category, subcategory) rules in taxonomy order.
+        # Within a category the subcategory keywords come before the bare
+        # category keywords, so the first hit in a linear scan gives the same
+        # precedence as checking the category and then its subcategories.
+        self._flat_patterns = []
+        for main_category, category_data in self.categories.items():
+            for subcat, keywords in category_data.get('subcategories', {}).items():
+                self._flat_patterns.extend((kw, main_category, subcat) for kw in keywords)
+            self._flat_patterns.extend(
+                (kw, main_category, None) for kw in category_data['keywords']
+            )
     
     def categorize(self, items: List[ReceiptItem]) -> Dict[str, List[ReceiptItem]]:
         """
@@ -66,7 +79,7 @@ class ExpenseCategorizer:
         categorized = {}
         
         for item in items:
-            category, subcategory = self._get_category(item.name)
+            category, subcategory = self._get_category(item.name.lower())
             
             # Create full category path
             full_category = f"{category} > {subcategory}" if subcategory else category
@@ -80,30 +93,19 @@ class ExpenseCategorizer:
         logger.info(f"Categorized items into {len(categorized)} categories")
         return categorized
     
-    def _get_category(self, item_name: str) -> tuple:
-        """Determine category and subcategory for an item"""
-        item_lower = item_name.lower()
-        
-        for main_category, category_data in self.categories.items():
-            # Check if item matches main category
-            if any(keyword in item_lower for keyword in category_data['keywords']):
-                # Check subcategories
-                for subcat, keywords in category_data.get('subcategories', {}).items():
-                    if any(keyword in item_lower for keyword in keywords):
-                        return main_category, subcat
-                return main_category, None
-            
-            # Check subcategories directly
-            for subcat, keywords in category_data.get('subcategories', {}).items():
-                if any(keyword in item_lower for keyword in keywords):
-                    return main_category, subcat
+    def _get_category(self, item_lower: str) -> tuple:
+        """Determine category and subcategory for an already lowercased item name"""
+        for keyword, main_category, subcat in self._flat_patterns:
+            if keyword in item_lower:
+                return main_category, subcat
         
         return "Other", None
     
-    def calculate_category_totals(self, categorized: Dict[str, List[ReceiptItem]]) -> Dict[str, float]:
+    @staticmethod
+    def calculate_category_totals(categorized: Dict[str, List[ReceiptItem]]) -> Dict[str, float]:
         """Calculate total spending per category"""
         totals = {}
         for category, items in categorized.items():
-            totals[category] = sum(item.price for item in items)
+            totals[category] = sum(map(attrgetter('price'), items))
 
         return totals
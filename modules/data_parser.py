@@ -1,11 +1,12 @@
 import re
+from operator import attrgetter
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 import logging
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class ReceiptItem:
     """Represents a single item on a receipt"""
     name: str
@@ -28,6 +29,18 @@ class DataParser:
             r'amex', r'receipt', r'thank you', r'store', r'address',
             r'phone', r'date', r'time', r'cashier', r'register'
         ]
+        
+        # Compile patterns once; ignore patterns are fused into one alternation
+        self._ignore_re = re.compile('|'.join(self.ignore_patterns), re.IGNORECASE)
+        self._price_re = re.compile(self.price_pattern)
+        self._qty_re = re.compile(self.quantity_pattern)
+        self._clean_re = re.compile(r'[^\w\s\-\.]')
+        
+        # Translation table mapping every ASCII character _clean_re would
+        # remove (punctuation other than '-', '.', '_', and control chars)
+        self._punct_table = str.maketrans(
+            {c: ' ' for c in map(chr, range(128)) if self._clean_re.match(c)}
+        )
     
     def parse(self, ocr_text: str) -> List[ReceiptItem]:
         """
@@ -48,7 +61,7 @@ class DataParser:
                 continue
             
             # Try to extract price
-            price_match = re.findall(self.price_pattern, line)
+            price_match = self._price_re.findall(line)
             if not price_match:
                 continue
             
@@ -60,7 +73,7 @@ class DataParser:
                 continue
             
             # Try to extract quantity
-            quantity_match = re.search(self.quantity_pattern, line)
+            quantity_match = self._qty_re.search(line)
             quantity = 1.0
             if quantity_match:
                 quantity = float(quantity_match.group(1))
@@ -80,24 +93,27 @@ class DataParser:
     
     def _should_ignore(self, line: str) -> bool:
         """Check if line should be ignored"""
-        line_lower = line.lower()
-        return any(re.search(pattern, line_lower) for pattern in self.ignore_patterns)
+        return self._ignore_re.search(line) is not None
     
     def _extract_item_name(self, line: str, price: float, quantity: float) -> str:
         """Extract clean item name from line"""
         # Remove price
-        line = re.sub(self.price_pattern, '', line)
+        line = self._price_re.sub('', line)
         
         # Remove quantity pattern
-        line = re.sub(self.quantity_pattern, '', line)
+        line = self._qty_re.sub('', line)
+        
+        # Remove special characters; the regex is only needed for non-ASCII
+        line = line.translate(self._punct_table)
+        if not line.isascii():
+            line = self._clean_re.sub(' ', line)
         
-        # Remove special characters and extra spaces
-        line = re.sub(r'[^\w\s\-\.]', ' ', line)
-        line = re.sub(r'\s+', ' ', line).strip()
+        # Collapse extra spaces
+        line = ' '.join(line.split())
         
         return line.title()
     
     def calculate_total(self, items: List[ReceiptItem]) -> float:
         """Calculate total from items"""
 
-        return sum(item.price for item in items)
+        return sum(map(attrgetter('price'), items))
@@ -9,54 +9,89 @@ logger = logging.getLogger(__name__)
 class ImageProcessor:
     """Handles image preprocessing for better OCR results"""
     
-    def __init__(self):
+    def __init__(self, aggressive_denoise=False, clahe_skip_std=55, otsu_std=70):
         self.supported_formats = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+        # Non-local means is much slower; only worth it for low-quality scans
+        self.aggressive_denoise = aggressive_denoise
+        # Grayscale std-dev above which an image is contrasty enough to skip
+        # CLAHE, and to use a global Otsu threshold instead of adaptive
+        self.clahe_skip_std = clahe_skip_std
+        self.otsu_std = otsu_std
     
-    def preprocess(self, image_path):
+    def preprocess(self, image):
         """
         Apply preprocessing techniques to enhance text visibility
         
+        Args:
+            image: Path to an image file, or an already decoded BGR image
+                   (numpy array)
+        
         Steps:
-        1. Convert to grayscale
-        2. Noise reduction
-        3. Contrast enhancement
-        4. Thresholding
-        5. Deskewing
+        1. Downscale large images
+        2. Convert to grayscale
+        3. Noise reduction
+        4. Contrast enhancement
+        5. Thresholding
+        6. Deskewing
+        7. Re-binarizing
         """
         try:
-            # Read image
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Could not read image: {image_path}")
+            # Read image (skipped when a decoded array is passed in)
+            if isinstance(image, np.ndarray):
+                img = image
+            else:
+                img = cv2.imread(image)
+                if img is None:
+                    raise ValueError(f"Could not read image: {image}")
+            
+            # Downscale first so every filter below runs on fewer pixels
+            img = self.resize_if_needed(img, max_width=1600)
             
             # Convert to grayscale
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             
             # Noise reduction
-            denoised = cv2.fastNlMeansDenoising(gray, h=30)
+            if self.aggressive_denoise:
+                denoised = cv2.fastNlMeansDenoising(gray, h=30)
+            else:
+                denoised = cv2.medianBlur(gray, 3)
+            
+            # Contrast check decides which of the steps below are needed
+            std = float(denoised.std())
             
-            # Contrast enhancement (CLAHE)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(denoised)
+            # Contrast enhancement (CLAHE), skipped on high-contrast images
+            if std > self.clahe_skip_std:
+                enhanced = denoised
+            else:
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                enhanced = clahe.apply(denoised)
             
-            # Adaptive thresholding
-            binary = cv2.adaptiveThreshold(
-                enhanced, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
+            # Thresholding: global Otsu is enough for very contrasty images
+            if std > self.otsu_std:
+                _, binary = cv2.threshold(
+                    enhanced, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU
+                )
+            else:
+                binary = cv2.adaptiveThreshold(
+                    enhanced, 255, 
+                    cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                    cv2.THRESH_BINARY, 11, 2
+                )
+            logger.info(
+                f"Contrast std={std:.1f}: "
+                f"CLAHE {'skipped' if std > self.clahe_skip_std else 'applied'}, "
+                f"{'Otsu' if std > self.otsu_std else 'adaptive'} threshold"
             )
             
             # Deskew image
             deskewed = self._deskew(binary)
             
-            # Additional sharpening
-            kernel = np.array([[-1,-1,-1],
-                               [-1, 9,-1],
-                               [-1,-1,-1]])
-            sharpened = cv2.filter2D(deskewed, -1, kernel)
+            # Re-binarize: cubic interpolation in the rotation leaves gray
+            # values along edges (this replaces the old sharpening pass)
+            _, cleaned = cv2.threshold(deskewed, 127, 255, cv2.THRESH_BINARY)
             
             logger.info("Image preprocessing completed successfully")
-            return sharpened
+            return cleaned
             
         except Exception as e:
             logger.error(f"Error in image preprocessing: {str(e)}")
@@ -64,7 +99,13 @@ class ImageProcessor:
     
     def _deskew(self, image):
         """Correct image skew"""
-        coords = np.column_stack(np.where(image > 0))
+        # findNonZero returns int32 (x, y) points without building an int64
+        # copy of every pixel; a strided subset is enough for minAreaRect
+        points = cv2.findNonZero(image)
+        if points is None:
+            return image
+        # Keep the (row, col) ordering the angle correction below expects
+        coords = np.ascontiguousarray(points.reshape(-1, 2)[::4, ::-1])
         angle = cv2.minAreaRect(coords)[-1]
         
         if angle < -45:
@@ -87,7 +128,7 @@ class ImageProcessor:
             scale = max_width / w
             new_w = int(w * scale)
             new_h = int(h * scale)
-            resized = cv2.resize(image, (new_w, new_h))
+            resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
             logger.info(f"Image resized from {w}x{h} to {new_w}x{new_h}")
             return resized
         return image
@@ -1,12 +1,144 @@
 import google.generativeai as genai
-from typing import Dict, List
+from google.api_core import exceptions as google_exceptions
+from typing import Dict, Iterator, List
+import asyncio
+import hashlib
+import json
 import os
+import re
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 import logging
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Concurrency and retry settings for batched Gemini calls
+MAX_CONCURRENT_REQUESTS = 50
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+
+# Prompt templates, filled with str.format_map
+SUMMARY_TEMPLATE = """Spending Analysis Summary:
+- Total spent: ${total_spent}
+- Number of items: {total_items}
+- Average item price: ${avg_item_price}
+- Top spending category: {top_category} (${top_category_amount})
+
+Spending by Category:
+{percentages}
+
+Areas of Concern:
+{anomalies}"""
+
+ADVICE_PROMPT_TEMPLATE = """{summary}
+
+Based on this spending data, provide:
+1. Three specific money-saving tips tailored to this spending pattern
+2. One actionable budgeting recommendation
+3. A positive observation about their spending habits
+"""
+
+MARSHALED_PROMPT_TEMPLATE = """{receipts}
+
+For each receipt above, provide money-saving advice tailored to its
+spending pattern. Return a JSON list with exactly {count} objects,
+in receipt order, each with the keys:
+- "advice": one actionable budgeting recommendation
+- "tips": a list of three specific money-saving tips
+- "positive": a positive observation about their spending habits
+"""
+
+# Summaries below this total, with no anomalies and no dominant category,
+# get rule-based advice without calling the LLM
+TRIVIAL_TOTAL_THRESHOLD = 5.0
+
+# Receipts packed into one prompt by generate_advice_marshaled; returns
+# diminish beyond ~10 per request
+MARSHAL_BATCH_SIZE = 8
+JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL)
+
+# LRU cache of Gemini responses keyed by a hash of the (rounded) spending
+# summary, shared across LLMAdvisor instances
+RESPONSE_CACHE_SIZE = 256
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# GenerativeModel shared across LLMAdvisor instances, so re-initializing an
+# advisor (e.g. on every Streamlit rerun) doesn't rebuild the model or reset
+# the SDK's cached clients. genai.configure is process-global, so there is
+# only ever one model, for the most recently configured API key.
+_model_lock = threading.Lock()
+_model = None
+_model_api_key = None
+
+# Event loop for generate_advice_batch, run forever in a daemon thread. The
+# SDK caches its async (grpc.aio) client, which stays bound to the loop it
+# first ran on, so every batch has to run on this same loop.
+_batch_loop = None
+_batch_loop_lock = threading.Lock()
+
+# Rate limit (429) and server-side (5xx) errors worth retrying
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+def _round_floats(value, ndigits=2):
+    """Recursively round floats inside nested dicts and lists"""
+    if isinstance(value, float):
+        return round(value, ndigits)
+    if isinstance(value, dict):
+        return {k: _round_floats(v, ndigits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round_floats(v, ndigits) for v in value]
+    return value
+
+def _get_model(api_key):
+    """Return the shared Gemini model, reconfiguring the SDK if the API key changed"""
+    global _model, _model_api_key
+    
+    with _model_lock:
+        # genai.configure drops the SDK's cached clients, so only call it
+        # when the key actually changes
+        if _model is None or api_key != _model_api_key:
+            genai.configure(api_key=api_key)
+            _model = genai.GenerativeModel('gemini-pro')
+            _model_api_key = api_key
+        return _model
+
+def _get_batch_loop():
+    """Return the shared batch event loop, starting its thread on first use"""
+    global _batch_loop
+    
+    with _batch_loop_lock:
+        if _batch_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='llm-advice-batch',
+                             daemon=True).start()
+            _batch_loop = loop
+        return _batch_loop
+
+class AdviceStream:
+    """
+    Iterable of advice text chunks from LLMAdvisor.generate_advice_stream
+    
+    source and complete are filled in as the stream is consumed: source names
+    where the text came from, and complete is False if the LLM response was
+    cut off part way through.
+    """
+    
+    def __init__(self):
+        self.source = None
+        self.complete = False
+        self._chunks = iter(())
+    
+    def __iter__(self) -> Iterator[str]:
+        return self._chunks
+
 class LLMAdvisor:
     """Generates personalized financial advice using LLM"""
     
@@ -14,54 +146,252 @@ class LLMAdvisor:
         """Initialize LLM (Gemini or fallback to rule-based advice)"""
         self.use_llm = False
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        # Memo of full category path -> main category
+        self._main_categories = {}
         
         if self.api_key:
             try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-pro')
+                self.model = _get_model(self.api_key)
                 self.use_llm = True
                 logger.info("LLM initialized successfully")
             except Exception as e:
                 logger.warning(f"Failed to initialize LLM: {str(e)}")
     
     def generate_advice(self, summary_stats: Dict, anomalies: List[Dict], 
-                        percentages: Dict[str, float]) -> Dict[str, str]:
+                        percentages: Dict[str, float], force_llm: bool = False) -> Dict[str, str]:
         """
         Generate personalized financial advice
         
+        Trivial summaries (see is_trivial_summary) get rule-based advice
+        without an LLM call unless force_llm is set.
+        
         Returns:
             Dictionary with different types of advice
         """
-        if self.use_llm:
+        if self.use_llm and (force_llm or
+                             not self.is_trivial_summary(summary_stats, anomalies, percentages)):
             return self._generate_llm_advice(summary_stats, anomalies, percentages)
         else:
             return self._generate_rule_based_advice(summary_stats, anomalies, percentages)
     
+    def generate_advice_stream(self, summary_stats: Dict, anomalies: List[Dict],
+                               percentages: Dict[str, float]) -> 'AdviceStream':
+        """
+        Stream LLM advice as it is generated, so the first words can be shown
+        before the full response arrives
+        
+        Unlike generate_advice this always asks the LLM; callers check
+        use_llm and is_trivial_summary first.
+        
+        Returns:
+            AdviceStream yielding chunks of advice text (markdown). Falls back
+            to rule-based advice text if the request fails before any text
+            arrives. Once iterated, its source and complete attributes tell
+            where the text came from and whether it finished.
+        """
+        stream = AdviceStream()
+        stream._chunks = self._stream_advice(stream, summary_stats, anomalies, percentages)
+        return stream
+    
+    def _stream_advice(self, stream, summary_stats, anomalies, percentages):
+        """Generator behind AdviceStream; records the source and completion on it"""
+        key = self._cache_key(summary_stats, anomalies, percentages)
+        cached = self._get_cached_advice(key)
+        if cached:
+            stream.source = cached['source']
+            yield cached['advice']
+            stream.complete = True
+            return
+        
+        context = self._build_context(summary_stats, anomalies, percentages)
+        
+        chunks = []
+        try:
+            for chunk in self.model.generate_content(context, stream=True):
+                stream.source = 'Gemini AI'
+                chunks.append(chunk.text)
+                yield chunk.text
+        except Exception as e:
+            logger.error(f"LLM streaming failed: {str(e)}")
+            if not chunks:
+                yield from self._stream_rule_based(stream, summary_stats, anomalies, percentages)
+            # Otherwise the text so far is truncated; complete stays False
+            return
+        
+        self._store_cached_advice(key, ''.join(chunks))
+        stream.source = 'Gemini AI'
+        stream.complete = True
+    
+    def _stream_rule_based(self, stream, summary_stats, anomalies, percentages):
+        """Yield rule-based advice text as a single chunk"""
+        stream.source = 'Rule-based System'
+        yield self._format_rule_based_text(summary_stats, anomalies, percentages)
+        stream.complete = True
+    
+    def is_trivial_summary(self, summary_stats: Dict, anomalies: List[Dict],
+                           percentages: Dict[str, float]) -> bool:
+        """
+        Check whether a summary is too simple to be worth an LLM call: a small
+        total with no anomalies and no category above 30% of spending
+        """
+        complexity_score = len(anomalies) + sum(1 for p in percentages.values() if p > 30)
+        return complexity_score == 0 and summary_stats['total_spent'] < TRIVIAL_TOTAL_THRESHOLD
+    
+    def generate_advice_batch(self, inputs: List[Dict]) -> List[Dict]:
+        """
+        Generate advice for many spending summaries concurrently
+        
+        Args:
+            inputs: List of dicts with 'summary_stats', 'anomalies' and
+                    'percentages' keys
+        
+        Returns:
+            List of advice dictionaries, in the same order as inputs
+        """
+        if not self.use_llm:
+            return [self._generate_rule_based_advice(i['summary_stats'], i['anomalies'],
+                                                     i['percentages'])
+                    for i in inputs]
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate_llm_advice_batch(inputs), _get_batch_loop()
+        )
+        return future.result()
+    
+    async def _generate_llm_advice_batch(self, inputs):
+        """Run Gemini calls concurrently, capped by a semaphore for rate limits"""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        
+        async def limited(i):
+            async with semaphore:
+                return await self._generate_llm_advice_async(
+                    i['summary_stats'], i['anomalies'], i['percentages']
+                )
+        
+        return await asyncio.gather(*[limited(i) for i in inputs])
+    
+    def generate_advice_marshaled(self, inputs: List[Dict]) -> List[Dict]:
+        """
+        Generate advice for several spending summaries, packing up to
+        MARSHAL_BATCH_SIZE of them into a single Gemini request
+        
+        Args:
+            inputs: List of dicts with 'summary_stats', 'anomalies' and
+                    'percentages' keys
+        
+        Returns:
+            List of {'advice': markdown text, 'source': ...} dictionaries, in
+            the same order as inputs, whether the advice came from the
+            batched request, the cache, a per-receipt call or the rule-based
+            fallback
+        """
+        if not self.use_llm:
+            return [self._rule_based_markdown_advice(i) for i in inputs]
+        
+        results = []
+        for start in range(0, len(inputs), MARSHAL_BATCH_SIZE):
+            results.extend(self._generate_marshaled_chunk(inputs[start:start + MARSHAL_BATCH_SIZE]))
+        return results
+    
+    def _generate_marshaled_chunk(self, chunk):
+        """Send one multi-receipt prompt for the uncached receipts, falling back to per-receipt calls"""
+        keys = [self._cache_key(i['summary_stats'], i['anomalies'], i['percentages'])
+                for i in chunk]
+        results = [self._get_cached_advice(key) for key in keys]
+        pending = [n for n, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        receipts = '\n\n'.join(
+            f"Receipt {n}:\n"
+            + self._format_summary(chunk[p]['summary_stats'], chunk[p]['anomalies'],
+                                   chunk[p]['percentages'])
+            for n, p in enumerate(pending, start=1)
+        )
+        context = MARSHALED_PROMPT_TEMPLATE.format_map({
+            'receipts': receipts,
+            'count': len(pending)
+        })
+        
+        try:
+            response = self.model.generate_content(context)
+            entries = self._parse_json_list(response.text)
+            if len(entries) != len(pending):
+                raise ValueError(f"expected {len(pending)} entries, got {len(entries)}")
+            texts = [self._format_marshaled_entry(entry) for entry in entries]
+        except Exception as e:
+            logger.warning(f"Batched LLM advice failed, falling back to per-receipt calls: {str(e)}")
+            for p in pending:
+                advice = self._generate_llm_advice(chunk[p]['summary_stats'], chunk[p]['anomalies'],
+                                                   chunk[p]['percentages'])
+                if 'advice' not in advice:  # Rule-based fallback
+                    advice = {
+                        'advice': self._render_rule_based_advice(advice),
+                        'source': advice['source']
+                    }
+                results[p] = advice
+            return results
+        
+        for p, text in zip(pending, texts):
+            self._store_cached_advice(keys[p], text)
+            results[p] = {
+                'advice': text,
+                'source': 'Gemini AI'
+            }
+        return results
+    
+    def _format_marshaled_entry(self, entry):
+        """Render one parsed entry of a batched response as markdown text"""
+        lines = [entry['advice']]
+        tips = entry.get('tips') or []
+        if tips:
+            lines += ['', '**Money-Saving Tips**']
+            lines += [f"- {tip}" for tip in tips]
+        if entry.get('positive'):
+            lines += ['', '**Positive Notes**', f"- {entry['positive']}"]
+        return '\n'.join(lines)
+    
+    def _parse_json_list(self, text):
+        """Extract a JSON list from an LLM response, with or without a code fence"""
+        match = JSON_FENCE_RE.search(text)
+        if match:
+            text = match.group(1)
+        entries = json.loads(text)
+        if not isinstance(entries, list):
+            raise ValueError("response is not a JSON list")
+        return entries
+    
+    def _build_context(self, summary_stats, anomalies, percentages):
+        """Build the LLM prompt for a spending summary"""
+        return ADVICE_PROMPT_TEMPLATE.format_map({
+            'summary': self._format_summary(summary_stats, anomalies, percentages)
+        })
+    
+    def _format_summary(self, summary_stats, anomalies, percentages):
+        """Format the spending data part of the LLM prompt"""
+        return SUMMARY_TEMPLATE.format_map({
+            'total_spent': summary_stats['total_spent'],
+            'total_items': summary_stats['total_items'],
+            'avg_item_price': summary_stats['avg_item_price'],
+            'top_category': summary_stats['top_category']['name'],
+            'top_category_amount': summary_stats['top_category']['amount'],
+            'percentages': self._format_percentages(percentages),
+            'anomalies': self._format_anomalies(anomalies)
+        })
+    
     def _generate_llm_advice(self, summary_stats, anomalies, percentages):
         """Generate advice using Gemini LLM"""
         
+        key = self._cache_key(summary_stats, anomalies, percentages)
+        cached = self._get_cached_advice(key)
+        if cached:
+            return cached
+        
         # Prepare context for LLM
-        context = f"""
-        Spending Analysis Summary:
-        - Total spent: ${summary_stats['total_spent']}
-        - Number of items: {summary_stats['total_items']}
-        - Average item price: ${summary_stats['avg_item_price']}
-        - Top spending category: {summary_stats['top_category']['name']} (${summary_stats['top_category']['amount']})
-        
-        Spending by Category:
-        {self._format_percentages(percentages)}
-        
-        Areas of Concern:
-        {self._format_anomalies(anomalies)}
-        
-        Based on this spending data, provide:
-        1. Three specific money-saving tips tailored to this spending pattern
-        2. One actionable budgeting recommendation
-        3. A positive observation about their spending habits
-        """
+        context = self._build_context(summary_stats, anomalies, percentages)
         
         try:
             response = self.model.generate_content(context)
+            self._store_cached_advice(key, response.text)
             return {
                 'advice': response.text,
                 'source': 'Gemini AI'
@@ -70,6 +400,64 @@ class LLMAdvisor:
             logger.error(f"LLM generation failed: {str(e)}")
             return self._generate_rule_based_advice(summary_stats, anomalies, percentages)
     
+    async def _generate_llm_advice_async(self, summary_stats, anomalies, percentages):
+        """Generate advice using Gemini LLM without blocking, retrying with backoff"""
+        key = self._cache_key(summary_stats, anomalies, percentages)
+        cached = self._get_cached_advice(key)
+        if cached:
+            return cached
+        
+        context = self._build_context(summary_stats, anomalies, percentages)
+        
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await self.model.generate_content_async(context)
+                self._store_cached_advice(key, response.text)
+                return {
+                    'advice': response.text,
+                    'source': 'Gemini AI'
+                }
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    logger.error(f"LLM generation failed after {attempt + 1} attempts: {str(e)}")
+                    break
+                delay = RETRY_BASE_DELAY * 2 ** attempt
+                logger.warning(f"LLM call failed ({str(e)}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error(f"LLM generation failed: {str(e)}")
+                break
+        
+        return self._generate_rule_based_advice(summary_stats, anomalies, percentages)
+    
+    def _cache_key(self, summary_stats, anomalies, percentages):
+        """Hash a spending summary, rounding floats so trivial differences still hit"""
+        payload = json.dumps(
+            _round_floats([summary_stats, anomalies, percentages]),
+            sort_keys=True, default=str
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+    
+    def _get_cached_advice(self, key):
+        """Return cached LLM advice for a key, or None"""
+        with _response_cache_lock:
+            text = _response_cache.get(key)
+            if text is None:
+                return None
+            _response_cache.move_to_end(key)
+        return {
+            'advice': text,
+            'source': 'Gemini AI (cached)'
+        }
+    
+    def _store_cached_advice(self, key, text):
+        """Store LLM advice text, evicting the least recently used entry"""
+        with _response_cache_lock:
+            _response_cache[key] = text
+            _response_cache.move_to_end(key)
+            if len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+    
     def _generate_rule_based_advice(self, summary_stats, anomalies, percentages):
         """Generate rule-based advice when LLM is unavailable"""
         
@@ -88,8 +476,12 @@ class LLMAdvisor:
                             f"which is ${anomaly['excess']:.2f} above typical budget")
         
         # Category-specific advice
+        has_healthcare = False
         for category, percentage in percentages.items():
-            main_cat = category.split(' > ')[0]
+            main_cat = self._main_category(category)
+            
+            if main_cat == 'Healthcare' and percentage > 0:
+                has_healthcare = True
             
             if percentage > 30:
                 advice.append(f"📊 {percentage:.1f}% of your spending is on {category}. "
@@ -107,7 +499,7 @@ class LLMAdvisor:
         if total < 100:
             positive_notes.append("Great job keeping total spending under $100!")
         
-        if 'Healthcare' in str(percentages) and percentages.get('Healthcare', 0) > 0:
+        if has_healthcare:
             positive_notes.append("Good to see you're investing in health and wellness")
         
         # Generate tips
@@ -126,14 +518,42 @@ class LLMAdvisor:
             'source': 'Rule-based System'
         }
     
+    def _main_category(self, category):
+        """Main category of a full path (e.g., "Groceries > Dairy" -> "Groceries")"""
+        main_cat = self._main_categories.get(category)
+        if main_cat is None:
+            main_cat = self._main_categories[category] = category.split(' > ', 1)[0]
+        return main_cat
+    
+    def _format_rule_based_text(self, summary_stats, anomalies, percentages):
+        """Render rule-based advice as markdown text"""
+        advice = self._generate_rule_based_advice(summary_stats, anomalies, percentages)
+        return self._render_rule_based_advice(advice)
+    
+    def _render_rule_based_advice(self, advice):
+        """Render a rule-based advice dictionary as markdown text"""
+        lines = [advice['summary'], '', '**Money-Saving Tips**']
+        lines += [f"- {tip}" for tip in advice['tips']]
+        lines += ['', '**Positive Notes**']
+        lines += [f"- {note}" for note in advice['positive_notes']]
+        return '\n'.join(lines)
+    
+    def _rule_based_markdown_advice(self, i):
+        """Rule-based advice for one input, in the {'advice', 'source'} shape"""
+        return {
+            'advice': self._format_rule_based_text(i['summary_stats'], i['anomalies'],
+                                                   i['percentages']),
+            'source': 'Rule-based System'
+        }
+    
     def _format_percentages(self, percentages):
         """Format percentages for LLM context"""
-        return '\n'.join([f"- {cat}: {pct:.1f}%" for cat, pct in percentages.items()])
+        return '\n'.join(f"- {cat}: {pct:.1f}%" for cat, pct in percentages.items())
     
     def _format_anomalies(self, anomalies):
         """Format anomalies for LLM context"""
         if not anomalies:
             return "No significant anomalies detected"
-        return '\n'.join([f"- {a['category']}: ${a['amount']:.2f} "
-                          f"(exceeds threshold by ${a['excess']:.2f})" 
-                          for a in anomalies])
\ No newline at end of file
+        return '\n'.join(f"- {a['category']}: ${a['amount']:.2f} "
+                         f"(exceeds threshold by ${a['excess']:.2f})"
+                         for a in anomalies)
\ No newline at end of file
@@ -1,26 +1,57 @@
 import pytesseract
-import easyocr
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Whitespace around line breaks (this also drops empty lines), and runs of
+# any other whitespace within a line
+_LINE_RE = re.compile(r'\s*\n\s*')
+_WS_RE = re.compile(r'[^\S\n]+')
+
+# Default worker threads for EasyOCR. torch already spreads each readtext
+# call over all cores with its intra-op thread pool, so more threads only
+# oversubscribe the CPU; two let one image's CPU-side pre/post-processing
+# overlap with another's inference.
+EASYOCR_MAX_WORKERS = 2
+
 class OCREngine:
     """Handles text extraction from receipt images"""
     
-    def __init__(self, use_easyocr=True):
+    def __init__(self, use_easyocr=True, batch_size=16):
         self.use_easyocr = use_easyocr
+        # Number of text crops EasyOCR recognizes per forward pass
+        self.batch_size = batch_size
+        self._reader = None
         
         if use_easyocr:
-            # Initialize EasyOCR with English language
-            self.reader = easyocr.Reader(['en'], gpu=False)
-            logger.info("EasyOCR initialized")
+            # The EasyOCR reader is loaded on first use, see `reader`
+            logger.info("EasyOCR selected")
         else:
             # Configure Tesseract path if needed (Windows)
             # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
             logger.info("Tesseract OCR initialized")
     
+    @property
+    def reader(self):
+        """EasyOCR reader, created on first access to avoid loading model weights early"""
+        if self._reader is None:
+            import easyocr
+            import torch
+            
+            # Initialize EasyOCR with English language, on the GPU when one
+            # is available. quantize=True is passed explicitly so the CPU path
+            # (including a CPU fallback) always gets int8 models: EasyOCR runs
+            # torch.quantization.quantize_dynamic over the nn.Linear/LSTM
+            # layers when loading on CPU, and ignores the flag on GPU.
+            gpu = torch.cuda.is_available()
+            self._reader = easyocr.Reader(['en'], gpu=gpu, quantize=True)
+            logger.info(f"EasyOCR initialized ({'GPU' if gpu else 'CPU'})")
+        return self._reader
+    
     def extract_text(self, image) -> str:
         """
         Extract text from preprocessed image
@@ -33,11 +64,16 @@ class OCREngine:
         """
         try:
             if self.use_easyocr:
-                result = self.reader.readtext(image, detail=0, paragraph=True)
+                # canvas_size/mag_ratio are left at their defaults so EasyOCR's
+                # dynamic input shape applies; paragraph=True only merges
+                # results after recognition and doesn't fix the input shape
+                result = self.reader.readtext(image, detail=0, paragraph=True,
+                                              batch_size=self.batch_size)
                 text = ' '.join(result)
             else:
                 # Use Tesseract with receipt-specific configuration
-                custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.$/% '
+                # (--oem 1 runs the LSTM engine only, skipping the legacy pass)
+                custom_config = r'--oem 1 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.$/% '
                 text = pytesseract.image_to_string(image, config=custom_config)
             
             # Clean up text
@@ -50,10 +86,41 @@ class OCREngine:
             logger.error(f"OCR extraction failed: {str(e)}")
             raise
     
+    def extract_text_batch(self, images: List) -> List[str]:
+        """Compatibility alias of extract_text_many, with the default worker count"""
+        return self.extract_text_many(images)
+    
+    def extract_text_many(self, images: List, max_workers: Optional[int] = None) -> List[str]:
+        """
+        Extract text from several preprocessed images in parallel
+        
+        Threads are enough for both backends: pytesseract runs each image in
+        a separate tesseract process, and torch releases the GIL during
+        EasyOCR inference, so the threads share one reader.
+        
+        Args:
+            images: Preprocessed images (numpy arrays)
+            max_workers: Number of worker threads (defaults to the CPU count
+                for Tesseract and EASYOCR_MAX_WORKERS for EasyOCR)
+        
+        Returns:
+            Extracted text for each image, in order
+        """
+        if len(images) <= 1:
+            return [self.extract_text(image) for image in images]
+        
+        if self.use_easyocr:
+            # Load the reader up front so worker threads don't race to create it
+            _ = self.reader
+            default_workers = EASYOCR_MAX_WORKERS
+        else:
+            default_workers = os.cpu_count() or 1
+        
+        workers = min(max_workers or default_workers, len(images))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.extract_text, images))
+    
     def _clean_text(self, text: str) -> str:
         """Basic text cleaning"""
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text)
-        # Remove empty lines
-        text = '\n'.join([line.strip() for line in text.split('\n') if line.strip()])
-        return text
\ No newline at end of file
+        # Strip lines, remove empty lines and collapse multiple spaces
+        return _WS_RE.sub(' ', _LINE_RE.sub('\n', text)).strip()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from modules.llm_advisor import LLMAdvisor
+
+
+class LoopBoundModel:
+    """Stand-in for GenerativeModel whose async client, like a grpc.aio
+    channel, only works on the event loop it first ran on"""
+    
+    def __init__(self):
+        self.loop = None
+    
+    async def generate_content_async(self, context):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif loop is not self.loop:
+            raise RuntimeError("attached to a different loop")
+        
+        class Response:
+            text = "Gemini advice"
+        return Response()
+
+
+def make_inputs(total):
+    return [{
+        'summary_stats': {
+            'total_spent': total + i,
+            'total_items': 3,
+            'avg_item_price': 5.0,
+            'top_category': {'name': 'Groceries', 'amount': 15.0}
+        },
+        'anomalies': [],
+        'percentages': {'Groceries': 100.0}
+    } for i in range(3)]
+
+
+def test_generate_advice_batch_reuses_event_loop():
+    advisor = LLMAdvisor(api_key='test-key')
+    advisor.model = LoopBoundModel()
+    
+    # Distinct totals so the second batch can't be served from the cache
+    for total in (1000.0, 2000.0):
+        results = advisor.generate_advice_batch(make_inputs(total))
+        assert [r['source'] for r in results] == ['Gemini AI'] * 3
+
+
+class MarshaledModel:
+    """Stand-in for GenerativeModel that answers batched prompts with JSON,
+    or fails every call when failing is set"""
+    
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.prompts = []
+    
+    def generate_content(self, context):
+        self.prompts.append(context)
+        if self.failing:
+            raise RuntimeError("service unavailable")
+        count = context.count('Receipt ')
+        
+        class Response:
+            text = json.dumps([
+                {'advice': 'Cook at home', 'tips': ['Buy in bulk'], 'positive': 'Nice'}
+            ] * count)
+        return Response()
+
+
+def test_generate_advice_marshaled_returns_one_shape():
+    advisor = LLMAdvisor(api_key='test-key')
+    advisor.model = MarshaledModel()
+    
+    results = advisor.generate_advice_marshaled(make_inputs(3000.0))
+    assert all(set(r) == {'advice', 'source'} for r in results)
+    assert '- Buy in bulk' in results[0]['advice']
+    
+    # A second call is served from the response cache without a request
+    cached = advisor.generate_advice_marshaled(make_inputs(3000.0))
+    assert [r['source'] for r in cached] == ['Gemini AI (cached)'] * 3
+    assert len(advisor.model.prompts) == 1
+    
+    # Failed batched and per-receipt calls fall back to rule-based advice
+    advisor.model = MarshaledModel(failing=True)
+    fallback = advisor.generate_advice_marshaled(make_inputs(4000.0))
+    assert all(set(r) == {'advice', 'source'} for r in fallback)
+    assert [r['source'] for r in fallback] == ['Rule-based System'] * 3